@@ -2,27 +2,60 @@ import streamlit as st
 import openmeteo_requests
 import requests_cache
 import pandas as pd
+import numpy as np
 from retry_requests import retry
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import datetime, timedelta, date
+from collections import namedtuple
 import altair as alt
-import streamlit.components.v1 as components
-from streamlit.components.v1 import html as html_component
-import json
-from urllib.parse import parse_qs
 
-# Setup the Open-Meteo API client with cache and retry on error
+# Cache key for a location. Coordinates are rounded to ~100 m so nearby inputs
+# share a cache entry; the forecast grid is much coarser than that.
+Coord = namedtuple('Coord', ['lat', 'lon'])
+
+def make_coord(latitude, longitude):
+    return Coord(round(latitude, 3), round(longitude, 3))
+
+# Weather icon for each WMO weather code (0-99), indexed directly by code
+ICON_LUT = np.full(100, '❓', dtype=object)
+ICON_LUT[0] = '☀️'
+ICON_LUT[1:3] = '⛅'
+ICON_LUT[3] = '☁️'
+ICON_LUT[45:49] = '🌫️'
+ICON_LUT[51:58] = '🌦️'
+ICON_LUT[61:68] = '🌧️'
+ICON_LUT[71:78] = '🌨️'
+ICON_LUT[80:83] = '🌦️'
+ICON_LUT[85:87] = '🌨️'
+ICON_LUT[95:100] = '⛈️'
+
+# Night variants: clear and partly cloudy skies show a moon instead of the sun
+NIGHT_ICON_LUT = ICON_LUT.copy()
+NIGHT_ICON_LUT[0:3] = '🌙'
+
+# Look up the icon for a weather code, falling back to '❓' for NaN or codes outside 0-99
+def weather_icon(code, is_day):
+    if not 0 <= code < len(ICON_LUT):
+        return '❓'
+    return (ICON_LUT if is_day else NIGHT_ICON_LUT)[int(code)]
+
+# Setup the Open-Meteo API client with an in-memory cache and retry on error.
+# Server Cache-Control headers take precedence over expire_after, expired responses
+# are revalidated with ETag/Last-Modified, and a stale copy is served if the API errors.
 @st.cache_resource
 def setup_openmeteo():
-    cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
+    cache_session = requests_cache.CachedSession(
+        'weather',
+        backend='memory',
+        expire_after=3600,
+        cache_control=True,
+        stale_if_error=True
+    )
     retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
     return openmeteo_requests.Client(session=retry_session)
 
 openmeteo = setup_openmeteo()
 
-# Function to fetch weather data
-@st.cache_data(ttl=3600)
+# Function to fetch weather data. Only called from the cached build_frames(), so
+# it isn't cached itself; requests_cache still handles HTTP-level reuse.
 def fetch_weather_data(latitude, longitude):
     url = "https://api.open-meteo.com/v1/forecast"
     params = {
@@ -30,7 +63,7 @@ def fetch_weather_data(latitude, longitude):
         "longitude": longitude,
         "current": ["temperature_2m", "relative_humidity_2m", "apparent_temperature", "precipitation", "rain", "showers", "snowfall", "is_day", "weather_code"],
         "hourly": ["temperature_2m", "relative_humidity_2m", "dew_point_2m", "apparent_temperature", "precipitation_probability", "cloud_cover"],
-        "daily": ["temperature_2m_max", "temperature_2m_min", "apparent_temperature_max", "apparent_temperature_min", "sunrise", "sunset"],
+        "daily": ["temperature_2m_max", "temperature_2m_min", "apparent_temperature_max", "apparent_temperature_min"],
         "temperature_unit": "fahrenheit",
         "wind_speed_unit": "mph",
         "precipitation_unit": "inch",
@@ -40,100 +73,74 @@ def fetch_weather_data(latitude, longitude):
     responses = openmeteo.weather_api(url, params=params)
     return responses[0]
 
-# Streamlit app
-st.title('Weather Forecast App')
-
-# Initialize session state for coordinates
-if 'latitude' not in st.session_state:
-    st.session_state.latitude = 36.1676029
-if 'longitude' not in st.session_state:
-    st.session_state.longitude = -86.8521476
-
-# Manual coordinate input
-st.write("Enter your coordinates:")
-latitude = st.number_input('Latitude', value=st.session_state.latitude)
-longitude = st.number_input('Longitude', value=st.session_state.longitude)
-
-# Store coordinates in session state
-st.session_state.latitude = latitude
-st.session_state.longitude = longitude
-
-# Add a fetch button and store response in session state
-if 'weather_data' not in st.session_state:
-    st.session_state.weather_data = None
-
-if st.button('Fetch Weather Data'):
-    response = fetch_weather_data(st.session_state.latitude, st.session_state.longitude)
-    st.session_state.weather_data = response
-    st.rerun()
-
-# Display weather data if available
-if st.session_state.weather_data is not None:
-    response = st.session_state.weather_data
-    
-    # Display current weather
-    st.header('Current Weather')
+# Reshape a date-indexed wide dataframe to long format for Altair without going through pd.melt
+def to_long(df, value_cols, value_name='Value'):
+    n = len(df)
+    dates = pd.DatetimeIndex(np.tile(df.index.values, len(value_cols))).tz_localize(df.index.tz)
+    measures = pd.Categorical(np.repeat(np.asarray(value_cols), n), categories=value_cols)
+    values = np.concatenate([df[c].values for c in value_cols])
+    return pd.DataFrame({df.index.name: dates, 'Measure': measures, value_name: values}, copy=False)
+
+# Copy the first n rows of a forecast section's variables into one contiguous
+# float32 block and return them as a dataframe indexed by date. The (variables x
+# timesteps) layout matches pandas' internal block, so the frame wraps it
+# without a copy.
+def section_frame(section, secs, columns, n=None):
+    secs = secs[:n]
+    m = len(secs)
+    arr = np.empty((len(columns), m), dtype=np.float32)
+    for i in range(len(columns)):
+        arr[i] = section.Variables(i).ValuesAsNumpy()[:m]
+    dates = pd.DatetimeIndex(secs.view('datetime64[s]'), tz='UTC', name='date')
+    return pd.DataFrame(arr.T, columns=columns, index=dates, copy=False)
+
+# Build the current values and long-format chart frames for a location
+@st.cache_data(ttl=3600, max_entries=256)
+def build_frames(coord):
+    response = fetch_weather_data(coord.lat, coord.lon)
+
+    # Current weather
     current = response.Current()
-    st.write(f"Temperature: {current.Variables(0).Value():.1f}°F")
-    st.write(f"Relative Humidity: {current.Variables(1).Value():.1f}%")
-    st.write(f"Apparent Temperature: {current.Variables(2).Value():.1f}°F")
-    st.write(f"Precipitation: {current.Variables(3).Value():.2f} inches")
-    st.write(f"Rain: {current.Variables(4).Value():.2f} inches")
-    st.write(f"Showers: {current.Variables(5).Value():.2f} inches")
-    st.write(f"Snow: {current.Variables(6).Value():.2f} inches")
-
-    # Process hourly data
+    current_names = ["Temperature", "Relative Humidity", "Apparent Temperature", "Precipitation",
+                     "Rain", "Showers", "Snow", "Is Day", "Weather Code"]
+    current_data = dict(zip(current_names,
+                            [current.Variables(i).Value() for i in range(len(current_names))]))
+
+    # Process hourly data, keeping only the rows needed for the 48-hour chart
     hourly = response.Hourly()
-    hourly_data = {
-        "date": pd.date_range(
-            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=hourly.Interval()),
-            inclusive="left"
-        ),
-        "Temp": hourly.Variables(0).ValuesAsNumpy(),
-        "Relative Humidity": hourly.Variables(1).ValuesAsNumpy(),
-        "Dew Point": hourly.Variables(2).ValuesAsNumpy(),
-        "Apparent Temperature": hourly.Variables(3).ValuesAsNumpy(),
-        "Precipitation Probability": hourly.Variables(4).ValuesAsNumpy(),
-        "Cloud Cover": hourly.Variables(5).ValuesAsNumpy()
-    }
-    hourly_dataframe = pd.DataFrame(data=hourly_data)
+    hourly_interval = hourly.Interval()
+    hourly_secs = np.arange(hourly.Time(), hourly.TimeEnd(), hourly_interval, dtype='int64')
+    n_keep = 48 * 3600 // hourly_interval
+    hourly_dataframe = section_frame(hourly, hourly_secs,
+                                     ['Temp', 'Relative Humidity', 'Dew Point', 'Apparent Temperature',
+                                      'Precipitation Probability', 'Cloud Cover'],
+                                     n_keep)
 
     # Process daily data
     daily = response.Daily()
-    daily_data = {
-        "date": pd.date_range(
-            start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-            end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-            freq=pd.Timedelta(seconds=daily.Interval()),
-            inclusive="left"
-        ),
-        "Temp Max": daily.Variables(0).ValuesAsNumpy(),
-        "Temp Min": daily.Variables(1).ValuesAsNumpy(),
-        "Apparent Temp Max": daily.Variables(2).ValuesAsNumpy(),
-        "Apparent Temp Min": daily.Variables(3).ValuesAsNumpy(),
-        "sunrise": daily.Variables(4).ValuesAsNumpy(),
-        "sunset": daily.Variables(5).ValuesAsNumpy()
-    }
-    daily_dataframe = pd.DataFrame(data=daily_data)
-
-    # Plot daily forecast
-    st.header('Daily Temperature Forecast')
-
-    # Melt the dataframe to long format for Altair
-    daily_long = pd.melt(daily_dataframe, 
-                        id_vars=['date'], 
-                        value_vars=['Temp Max', 'Temp Min', 
-                                    'Apparent Temp Max', 'Apparent Temp Min'],
-                        var_name='Measure', value_name='Temperature')
-
-    # Create the Altair chart
-    daily_chart = alt.Chart(daily_long).mark_line(point=True).encode(
+    daily_secs = np.arange(daily.Time(), daily.TimeEnd(), daily.Interval(), dtype='int64')
+    daily_dataframe = section_frame(daily, daily_secs,
+                                    ['Temp Max', 'Temp Min', 'Apparent Temp Max', 'Apparent Temp Min'])
+
+    # Reshape the dataframes to long format for Altair
+    daily_long = to_long(daily_dataframe,
+                         ['Temp Max', 'Temp Min',
+                          'Apparent Temp Max', 'Apparent Temp Min'],
+                         value_name='Temperature')
+    hourly_long = to_long(hourly_dataframe,
+                          ['Temp', 'Relative Humidity', 'Dew Point',
+                           'Apparent Temperature', 'Precipitation Probability'])
+
+    return current_data, daily_long, hourly_long
+
+# Compile the Altair charts to Vega-Lite specs once; only the data changes between reruns
+@st.cache_resource
+def daily_chart_spec():
+    daily_chart = alt.Chart().mark_line(point=True).encode(
         x=alt.X('date:T', axis=alt.Axis(format='%Y-%m-%d', labelAngle=-45, title='Date')),
         y=alt.Y('Temperature:Q', axis=alt.Axis(title='Temperature (°F)')),
         color=alt.Color('Measure:N', legend=alt.Legend(title="Measure")),
-        tooltip=['date:T', 'Measure:N', 'Temperature:Q']
+        tooltip=['date:T', 'Measure:N', alt.Tooltip('Temperature:Q', format='.1f')]
     ).properties(
         width=800,
         height=500,
@@ -141,40 +148,78 @@ if st.session_state.weather_data is not None:
     ).interactive()
 
     # Customize the legend
-    daily_chart = daily_chart.configure_legend(
+    return daily_chart.configure_legend(
         orient='bottom',
         labelFontSize=12,
         titleFontSize=14
-    )
-
-    st.altair_chart(daily_chart, use_container_width=True)
+    ).to_dict()
 
-    # Plot hourly forecast
-    st.header('Hourly Forecast (Next 48 Hours)')
-    end_date = date.today() + timedelta(days=2)
-    hourly_dataframe = hourly_dataframe.loc[hourly_dataframe['date'].dt.date < end_date]
-
-    # Melt the dataframe to long format for Altair
-    hourly_long = pd.melt(hourly_dataframe, id_vars=['date'], 
-                         value_vars=['Temp', 'Relative Humidity', 'Dew Point', 
-                                     'Apparent Temperature', 'Precipitation Probability'],
-                         var_name='Measure', value_name='Value')
-
-    # Create the Altair chart
-    hourly_chart = alt.Chart(hourly_long).mark_line().encode(
+@st.cache_resource
+def hourly_chart_spec():
+    hourly_chart = alt.Chart().mark_line().encode(
         x=alt.X('date:T', axis=alt.Axis(format='%Y-%m-%d %H:%M', labelAngle=-90)),
         y='Value:Q',
         color='Measure:N',
-        tooltip=['date:T', 'Measure:N', 'Value:Q']
+        tooltip=['date:T', 'Measure:N', alt.Tooltip('Value:Q', format='.1f')]
     ).properties(
         width=800,
         height=500
     ).interactive()
-    
+
     # Customize the legend
-    hourly_chart = hourly_chart.configure_legend(
+    return hourly_chart.configure_legend(
         orient='bottom',
         labelFontSize=12,
         titleFontSize=14
-    )
-    st.altair_chart(hourly_chart, use_container_width=True)
+    ).to_dict()
+
+# Streamlit app
+st.title('Weather Forecast App')
+
+# Initialize session state for coordinates
+if 'latitude' not in st.session_state:
+    st.session_state.latitude = 36.1676029
+if 'longitude' not in st.session_state:
+    st.session_state.longitude = -86.8521476
+
+# Add a place to store the processed frames in session state
+if 'weather_data' not in st.session_state:
+    st.session_state.weather_data = None
+
+# Manual coordinate input, bound directly to the session state keys. The form
+# keeps edits from rerunning the script until the fetch button is pressed.
+with st.form('coordinates'):
+    st.write("Enter your coordinates:")
+    st.number_input('Latitude', key='latitude')
+    st.number_input('Longitude', key='longitude')
+    fetch = st.form_submit_button('Fetch Weather Data')
+
+if fetch:
+    st.session_state.weather_data = build_frames(make_coord(st.session_state.latitude,
+                                                            st.session_state.longitude))
+
+# Display weather data if available
+if st.session_state.weather_data is not None:
+    current_data, daily_long, hourly_long = st.session_state.weather_data
+    
+    # Display current weather
+    st.header('Current Weather')
+    current_display = {
+        "Conditions": weather_icon(current_data['Weather Code'], current_data['Is Day']),
+        "Temperature": f"{current_data['Temperature']:.1f}°F",
+        "Relative Humidity": f"{current_data['Relative Humidity']:.1f}%",
+        "Apparent Temperature": f"{current_data['Apparent Temperature']:.1f}°F",
+        "Precipitation": f"{current_data['Precipitation']:.2f} inches",
+        "Rain": f"{current_data['Rain']:.2f} inches",
+        "Showers": f"{current_data['Showers']:.2f} inches",
+        "Snow": f"{current_data['Snow']:.2f} inches"
+    }
+    st.table(pd.DataFrame.from_dict(current_display, orient='index', columns=['Value']))
+
+    # Plot daily forecast
+    st.header('Daily Temperature Forecast')
+    st.vega_lite_chart(daily_long, daily_chart_spec(), use_container_width=True)
+
+    # Plot hourly forecast
+    st.header('Hourly Forecast (Next 48 Hours)')
+    st.vega_lite_chart(hourly_long, hourly_chart_spec(), use_container_width=True)